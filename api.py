@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import os
-import pickle
 import json
 import logging
+import threading
+from functools import lru_cache
+from urllib.parse import quote
 import pandas as pd
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
@@ -13,6 +16,7 @@ import uvicorn
 from utils.text_to_speech import TextToSpeech
 from utils.news_scraper import NewsScraper
 from utils.gemini_service import GeminiService
+from utils import store
 
 # Configure logging
 logging.basicConfig(
@@ -43,8 +47,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class JSONGZipMiddleware(GZipMiddleware):
+    """GZip middleware that leaves the already-compressed /audio responses alone"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/audio/"):
+            # mp3 doesn't shrink, and streaming it as gzip would drop Content-Length
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Compress larger JSON responses such as full sentiment payloads
+app.add_middleware(JSONGZipMiddleware, minimum_size=1024)
+
 # Initialize services
 tts_service = TextToSpeech()
+news_scraper = NewsScraper()
+_gemini_service: Optional[GeminiService] = None
+
+# Parsed company list, refreshed only when the CSV's mtime changes
+_COMPANY_CACHE = {"mtime": None, "df": None, "names": frozenset(), "json": None, "etag": None}
+_COMPANY_CACHE_LOCK = threading.Lock()
 
 
 # Define Pydantic models for request/response validation
@@ -77,39 +101,91 @@ class SentimentAnalysis(BaseModel):
 
 
 # Helper functions
-def load_company_list():
-    """Load the list of companies from the CSV file"""
-    try:
-        csv_path = os.path.join('data', 'company_list.csv')
-        if os.path.exists(csv_path):
-            return pd.read_csv(csv_path)
-        else:
-            logger.error(f"Company list file not found at {csv_path}")
-            return pd.DataFrame(columns=['name', 'ticker'])
-    except Exception as e:
-        logger.error(f"Error loading company list: {e}")
-        return pd.DataFrame(columns=['name', 'ticker'])
+def get_gemini_service() -> GeminiService:
+    """Get the shared GeminiService, creating it on first use (requires GOOGLE_API_KEY)"""
+    global _gemini_service
+    if _gemini_service is None:
+        _gemini_service = GeminiService()
+    return _gemini_service
+
 
+def _empty_company_list() -> pd.DataFrame:
+    """Empty company list with the same shape as a loaded one"""
+    return pd.DataFrame(columns=['name', 'ticker']).set_index('name')
 
-def get_pickle_path(company_name: str) -> str:
-    """Get the path to the pickle file for a company"""
-    filename = f"{company_name.lower().replace(' ', '_')}.pkl"
+
+def load_company_list() -> pd.DataFrame:
+    """
+    Load the list of companies from the CSV file, cached until the file changes
+
+    Returns:
+        DataFrame indexed by company name
+    """
+    csv_path = os.path.join('data', 'company_list.csv')
+    try:
+        mtime = os.stat(csv_path).st_mtime
+    except FileNotFoundError:
+        logger.error("Company list file not found at %s", csv_path)
+        return _empty_company_list()
+
+    if _COMPANY_CACHE["mtime"] == mtime:
+        return _COMPANY_CACHE["df"]
+
+    with _COMPANY_CACHE_LOCK:
+        if _COMPANY_CACHE["mtime"] != mtime:
+            try:
+                df = pd.read_csv(csv_path).set_index('name')
+            except Exception as e:
+                logger.error("Error loading company list: %s", e)
+                return _empty_company_list()
+            _COMPANY_CACHE["df"] = df
+            _COMPANY_CACHE["names"] = frozenset(df.index)
+            # Pre-serialized /companies response body
+            _COMPANY_CACHE["json"] = json.dumps(
+                {"companies": df.reset_index().to_dict(orient="records")}
+            ).encode('utf-8')
+            _COMPANY_CACHE["etag"] = f'"{mtime}"'
+            _COMPANY_CACHE["mtime"] = mtime
+        return _COMPANY_CACHE["df"]
+
+
+def company_exists(company_name: str) -> bool:
+    """Check whether a company is present in the company list"""
+    load_company_list()
+    return company_name in _COMPANY_CACHE["names"]
+
+
+def get_data_path(company_name: str) -> str:
+    """Get the path to the stored analysis file for a company"""
+    filename = f"{store.slugify(company_name)}{store.EXTENSION}"
     return os.path.join('data', 'output', filename)
 
 
+@lru_cache(maxsize=128)
+def _load_cached(data_path: str, mtime: float) -> Dict[str, Any]:
+    """Deserialize a stored analysis file; mtime is part of the cache key so rewrites miss"""
+    return store.load(data_path)
+
+
+def save_sentiment_data(company_name: str, data: Dict[str, Any]) -> None:
+    """Persist sentiment data for a company and drop stale cache entries"""
+    store.save(get_data_path(company_name), data)
+    _load_cached.cache_clear()
+
+
 def load_sentiment_data(company_name: str) -> Optional[Dict[str, Any]]:
-    """Load sentiment data for a specific company from pickle file"""
+    """Load sentiment data for a specific company from its stored analysis file"""
     try:
-        pickle_path = get_pickle_path(company_name)
-        if not os.path.exists(pickle_path):
+        data_path = get_data_path(company_name)
+        try:
+            mtime = os.path.getmtime(data_path)
+        except FileNotFoundError:
             return None
 
-        with open(pickle_path, 'rb') as f:
-            data = pickle.load(f)
-
-        return data
+        # Hand out a shallow copy so callers can't mutate the cached entry
+        return dict(_load_cached(data_path, mtime))
     except Exception as e:
-        logger.error(f"Error loading sentiment data for {company_name}: {e}")
+        logger.error("Error loading sentiment data for %s: %s", company_name, e)
         return None
 
 async def generate_hindi_tts(sentiment_data: Dict[str, Any],company_name: str) -> Dict[str, Any]:
@@ -120,28 +196,26 @@ async def generate_hindi_tts(sentiment_data: Dict[str, Any],company_name: str) -
         hindi_text= await tts_service.process_sentiment_tts(sentiment_data,company_name)
         return hindi_text
     except Exception as e:
-        logger.error(f"Error generating Hindi TTS: {e}")
+        logger.error("Error generating Hindi TTS: %s", e)
 
     return sentiment_data
 
 
 async def analyze_company(company_name: str) -> Dict[str, Any]:
     """Analyze news articles for a company and generate sentiment analysis"""
-    logger.info(f"Analysis for company: {company_name}")
+    logger.info("Analysis for company: %s", company_name)
 
     try:
-        # Initialize services
-        news_scraper = NewsScraper()
-        gemini_service = GeminiService()
+        gemini_service = get_gemini_service()
 
         # Scrape news articles - standard 10 articles
-        articles = news_scraper.get_company_news(
+        articles = await news_scraper.get_company_news(
             company_name=company_name,
             num_articles=10,
         )
 
         if not articles:
-            logger.warning(f"No articles found for {company_name}")
+            logger.warning("No articles found for %s", company_name)
             return {
                 "Company": company_name,
                 "Articles": [],
@@ -151,14 +225,13 @@ async def analyze_company(company_name: str) -> Dict[str, Any]:
             }
 
         # Analyze with Gemini
-        logger.info(f"Analyzing {len(articles)} articles with Gemini")
-        analysis = gemini_service.analyze_articles(company_name, articles)
+        logger.info("Analyzing %d articles with Gemini", len(articles))
+        analysis = await gemini_service.analyze_articles(company_name, articles)
 
         # Add ticker if available
         companies_df = load_company_list()
-        company_row = companies_df[companies_df['name'] == company_name]
-        if not company_row.empty and 'ticker' in company_row.columns:
-            analysis["Ticker"] = company_row.iloc[0]['ticker']
+        if company_name in companies_df.index and 'ticker' in companies_df.columns:
+            analysis["Ticker"] = companies_df.at[company_name, 'ticker']
 
         # Generate Hindi TTS
         analysis = await tts_service.process_sentiment_tts(analysis,company_name)
@@ -167,24 +240,22 @@ async def analyze_company(company_name: str) -> Dict[str, Any]:
         output_dir = os.path.join('data', 'output')
         os.makedirs(output_dir, exist_ok=True)
 
-        # Save as pickle
-        pickle_path = get_pickle_path(company_name)
-        with open(pickle_path, 'wb') as f:
-            pickle.dump(analysis, f)
-
-        # Save as JSON for easier inspection
-        json_path = os.path.join(output_dir, f"{company_name.lower().replace(' ', '_')}.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(analysis, f, ensure_ascii=False, indent=2)
+        save_sentiment_data(company_name, analysis)
 
-        logger.info(f"Analysis completed and saved for {company_name}")
+        logger.info("Analysis completed and saved for %s", company_name)
         return analysis
 
     except Exception as e:
-        logger.error(f"Error analyzing {company_name}: {e}", exc_info=True)
+        logger.error("Error analyzing %s: %s", company_name, e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error analyzing {company_name}: {str(e)}")
 
 
+@app.on_event("startup")
+async def warm_company_list():
+    """Parse the company list once at startup so the first request doesn't pay for it"""
+    load_company_list()
+
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -197,16 +268,24 @@ async def root():
 
 
 @app.get("/companies")
-async def get_companies():
+async def get_companies(request: Request):
     """Get the list of available companies"""
     companies_df = load_company_list()
-    return {"companies": companies_df.to_dict(orient="records")}
+    if companies_df is not _COMPANY_CACHE["df"]:
+        # The company list could not be loaded
+        return {"companies": []}
+
+    headers = {"ETag": _COMPANY_CACHE["etag"]}
+    if request.headers.get("if-none-match") == _COMPANY_CACHE["etag"]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=_COMPANY_CACHE["json"], media_type="application/json", headers=headers)
 
 
 @app.get("/sentiment/{company_name}")
 async def get_sentiment(
         company_name: str,
-        generate_tts: bool = True):
+        generate_tts: bool = False):
 
     """
     Get sentiment analysis for a specific company
@@ -216,8 +295,7 @@ async def get_sentiment(
         generate_tts: Whether to generate TTS if not already present
     """
     # Check if the company exists
-    companies_df = load_company_list()
-    if company_name not in companies_df['name'].values:
+    if not company_exists(company_name):
         raise HTTPException(status_code=404, detail=f"Company '{company_name}' not found")
 
     # Load existing sentiment data
@@ -226,61 +304,71 @@ async def get_sentiment(
         raise HTTPException(status_code=404, detail=f"No sentiment data found for {company_name}")
 
 
-    # Generate Hindi TTS if requested
-    if generate_tts or ("Hindi_Translation" not in sentiment_data or "Audio_Path" not in sentiment_data):
+    # Generate Hindi TTS only if requested and not already present
+    needs_tts = generate_tts and (
+        "Hindi_Translation" not in sentiment_data
+        or "Audio_Path" not in sentiment_data
+        or not os.path.exists(sentiment_data.get("Audio_Path") or "")
+    )
+    if needs_tts:
         try:
             sentiment_data = await generate_hindi_tts(sentiment_data,company_name)
             # Save updated data with TTS
-            print("Audio path",sentiment_data['Audio_Path'])
-            pickle_path = get_pickle_path(company_name)
-            with open(pickle_path, 'wb') as f:
-                pickle.dump(sentiment_data, f)
+            save_sentiment_data(company_name, sentiment_data)
 
         except Exception as e:
-            logger.error(f"Error generating TTS for {company_name}: {e}")
+            logger.error("Error generating TTS for %s: %s", company_name, e)
+
+    # Point clients at the audio endpoint so they don't need a second lookup
+    sentiment_data["Audio_URL"] = f"/audio/{quote(company_name)}"
 
     return sentiment_data
 
 
 @app.get("/audio/{company_name}")
-async def get_audio(company_name: str):
+async def get_audio(company_name: str, request: Request):
     """
     Get the audio file for a company's sentiment analysis
 
     Args:
         company_name: Name of the company
+        request: Incoming request, used for conditional GET via If-None-Match
     """
     # Check if the company exists
-    companies_df = load_company_list()
-    if company_name not in companies_df['name'].values:
+    if not company_exists(company_name):
         raise HTTPException(status_code=404, detail=f"Company '{company_name}' not found")
 
-    # Load sentiment data
-    sentiment_data = load_sentiment_data(company_name)
-    if not sentiment_data:
-        raise HTTPException(status_code=404, detail=f"No sentiment data found for {company_name}")
+    # Only touch the sentiment data when the audio has not been generated yet
+    audio_path = tts_service.get_audio_path(company_name)
+    if not os.path.exists(audio_path):
+        sentiment_data = load_sentiment_data(company_name)
+        if not sentiment_data:
+            raise HTTPException(status_code=404, detail=f"No sentiment data found for {company_name}")
 
-    # Generate TTS if not already present
-    if "Audio_Path" not in sentiment_data or not os.path.exists(sentiment_data["Audio_Path"]):
         try:
             sentiment_data = await generate_hindi_tts(sentiment_data,company_name)
 
             # Save updated data
-            pickle_path = get_pickle_path(company_name)
-            with open(pickle_path, 'wb') as f:
-                pickle.dump(sentiment_data,f)
+            save_sentiment_data(company_name, sentiment_data)
         except Exception as e:
-            logger.error(f"Error generating hindi audio for {company_name}: {e}")
+            logger.error("Error generating hindi audio for %s: %s", company_name, e)
+
+        audio_path = sentiment_data.get("Audio_Path")
+        if not audio_path or not os.path.exists(audio_path):
+            raise HTTPException(status_code=404, detail="Audio file not found")
 
-    # Return the audio file
-    audio_path = sentiment_data.get("Audio_Path")
-    if not audio_path or not os.path.exists(audio_path):
-        raise HTTPException(status_code=404, detail="Audio file not found")
+    # Return the audio file, or 304 if the client already has this version
+    stat = os.stat(audio_path)
+    etag = f'"{int(stat.st_mtime)}-{stat.st_size}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
 
     return FileResponse(
         audio_path,
         media_type="audio/mpeg",
-        filename=f"{company_name.lower().replace(' ', '_')}_sentiment.mp3"
+        filename=f"{store.slugify(company_name)}_sentiment.mp3",
+        headers=headers
     )
 
 
@@ -288,5 +376,14 @@ if __name__ == "__main__":
     # Ensure the output directory exists
     os.makedirs(os.path.join('data', 'output'), exist_ok=True)
 
-    # Run the API server
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    # Run the API server; "auto" picks uvloop/httptools when installed (not available on Windows).
+    # Set UVICORN_RELOAD=1 for development, which forces a single worker.
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("UVICORN_WORKERS", os.cpu_count() or 1)),
+        loop="auto",
+        http="auto",
+        reload=os.getenv("UVICORN_RELOAD") == "1"
+    ) 
\ No newline at end of file
@@ -1,11 +1,13 @@
 import streamlit as st
 import os
-import base64
 import pandas as pd
 import requests
+from urllib.parse import quote
 from datetime import datetime
 import plotly.graph_objects as go
 
+from utils import store
+
 # API Configuration
 API_URL = "http://localhost:8000"  # URL for the FastAPI service
 USE_API = True  # Set to False to use direct file access instead of API
@@ -18,105 +20,47 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Apply custom CSS
-st.markdown("""
-<style>
-    .main .block-container {
-        padding-top: 2rem;
-    }
-    .company-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        margin-bottom: 1rem;
-    }
-    .last-updated {
-        font-size: 0.8rem;
-        color: #666;
-        font-style: italic;
-    }
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        margin-bottom: 1rem;
-    }
-    .sentiment-badge {
-        padding: 0.3rem 0.8rem;
-        border-radius: 2rem;
-        font-weight: bold;
-        display: inline-block;
-        margin-bottom: 1rem;
-    }
-    .sentiment-badge.positive {
-        background-color: #d4edda;
-        color: #155724;
-    }
-    .sentiment-badge.negative {
-        background-color: #f8d7da;
-        color: #721c24;
-    }
-    .sentiment-badge.neutral {
-        background-color: #e2e3e5;
-        color: #383d41;
-    }
-    .sentiment-badge.mixed {
-        background-color: #fff3cd;
-        color: #856404;
-    }
-    .sentiment-value {
-        font-size: 1.5rem;
-        font-weight: bold;
-    }
-    .article-card {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-        border: 1px solid #e0e0e0;
-    }
-    .article-title {
-        font-weight: bold;
-        font-size: 1.1rem;
-    }
-    hr {
-        margin-top: 2rem;
-        margin-bottom: 2rem;
-    }
-    .tab-content {
-        padding: 1rem;
-    }
-    .stMetric {
-        background-color: #f8f9fa;
-        padding: 1rem;
-        border-radius: 0.5rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+
+# Load custom CSS
+@st.cache_data
+def load_css():
+    """Read the stylesheet once; the cached string is reused on every rerun"""
+    with open(os.path.join('static', 'styles.css'), encoding='utf-8') as f:
+        return f.read()
+
+
+# Apply custom CSS (must be emitted on every rerun, Streamlit rebuilds the page each time)
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # Initialize session state variables
 if 'analysis_running' not in st.session_state:
     st.session_state.analysis_running = False
-if 'api_available' not in st.session_state:
-    st.session_state.api_available = False
 
 
 # Check API availability
-@st.cache_data(ttl=60)
 def check_api_availability():
-    """Check if the API is available"""
+    """Probe the API once; the result is kept in st.session_state.api_available"""
     if not USE_API:
         return False
 
     try:
-        response = requests.get(f"{API_URL}/", timeout=2)
+        # The API runs locally, so it either answers right away or isn't running
+        response = requests.get(f"{API_URL}/", timeout=0.5)
         return response.status_code == 200
     except:
         return False
 
 
+def api_available():
+    """Whether the API was reachable when this session last probed it"""
+    return st.session_state.get("api_available", False)
+
+
 # Load company list
 @st.cache_data(ttl=600)
 def load_company_list():
     """Load the list of companies from API or local CSV"""
-    if USE_API and check_api_availability():
+    if USE_API and api_available():
         try:
             response = requests.get(f"{API_URL}/companies", timeout=5)
             if response.status_code == 200:
@@ -141,12 +85,12 @@ def load_company_list():
 # Load sentiment data
 @st.cache_data(ttl=300)
 def load_sentiment_data(company_name):
-    """Load sentiment data for a specific company from API or local pickle"""
-    if USE_API and check_api_availability():
+    """Load sentiment data for a specific company from API or local analysis file"""
+    if USE_API and api_available():
         try:
             response = requests.get(
                 f"{API_URL}/sentiment/{company_name}",
-                params={"generate_tts":True},
+                params={"generate_tts":False},
                 timeout=10
             )
             if response.status_code == 200:
@@ -160,31 +104,19 @@ def load_sentiment_data(company_name):
 
     # Fallback to local file
     try:
-        file_path = os.path.join('data', 'output', f"{company_name.lower().replace(' ', '_')}.pkl")
+        file_path = os.path.join('data', 'output', f"{store.slugify(company_name)}{store.EXTENSION}")
         if not os.path.exists(file_path):
             return None
 
-        with open(file_path, 'rb') as f:
-            import pickle
-            return pickle.load(f)
+        return store.load(file_path)
     except Exception as e:
         st.error(f"Error loading sentiment data: {e}")
         return None
 
 
 # Get audio content
-def get_audio_content(company_name):
-    """Get audio content for a company from API or local file"""
-    if USE_API and check_api_availability():
-        try:
-            response = requests.get(f"{API_URL}/audio/{company_name}", stream=True)
-            if response.status_code == 200:
-                return response.content
-        except Exception as e:
-            st.warning(f"Error fetching audio from API: {e}. Trying local file.")
-
-    # Fallback to local file
-    sentiment_data = load_sentiment_data(company_name)
+def get_audio_content(sentiment_data):
+    """Get audio content for already loaded sentiment data from the local audio file"""
     if sentiment_data and "Audio_Path" in sentiment_data:
         audio_path = sentiment_data["Audio_Path"]
         if os.path.exists(audio_path):
@@ -196,8 +128,8 @@ def get_audio_content(company_name):
 
 # Run analysis (immediate, synchronous)
 def run_analysis(company_name):
-    """Refresh data for a company by forcibly fetching from the latest pickle file"""
-    if not USE_API or not check_api_availability():
+    """Refresh data for a company by forcibly fetching from the latest analysis file"""
+    if not USE_API or not api_available():
         st.error("API is not available. Please start the API server.")
         return None
 
@@ -240,28 +172,12 @@ def format_timestamp(timestamp_str):
         return timestamp_str
 
 
-# Generate HTML for audio playback
-def get_audio_html(audio_content):
-    """Generate HTML for audio playback"""
-    if not audio_content:
-        return None
-
-    audio_b64 = base64.b64encode(audio_content).decode()
-    return f"""
-    <audio controls>
-      <source src="data:audio/mp3;base64,{audio_b64}" type="audio/mp3">
-      Your browser does not support the audio element.
-    </audio>
-    """
-
-
-
 def main():
     """Main Streamlit application"""
 
-    # Check API availability on startup
-    check_api_availability()
-    st.session_state.api_available = check_api_availability()
+    # Check API availability once per session
+    if "api_available" not in st.session_state:
+        st.session_state.api_available = check_api_availability()
     sentiment_data={}
 
     # Sidebar
@@ -276,6 +192,11 @@ def main():
             #     st.error("API is not available")
             #     st.info("Please start the API server with: `python api.py`")
 
+            if st.button("Refresh API status"):
+                del st.session_state.api_available
+                load_company_list.clear()
+                st.rerun()
+
         # Load company list
         companies_df = load_company_list()
 
@@ -351,18 +272,24 @@ def main():
 
                         # Display audio if available
                         st.subheader("Audio Summary (Hindi)")
-                        audio_content = get_audio_content(company_name)
-                        if audio_content:
-                            audio_html = get_audio_html(audio_content)
-                            if audio_html:
-                                st.markdown(audio_html, unsafe_allow_html=True)
+                        if USE_API and api_available():
+                            # Let the browser fetch the mp3 from the API directly
+                            audio_url = sentiment_data.get("Audio_URL", f"/audio/{quote(company_name)}")
+                            st.audio(f"{API_URL}{audio_url}", format="audio/mp3")
                         else:
-                            st.warning("Audio not available.")
+                            audio_content = get_audio_content(sentiment_data)
+                            if audio_content:
+                                st.audio(audio_content, format="audio/mp3")
+                            else:
+                                st.warning("Audio not available.")
 
                     with col2:
                         # Display sentiment distribution chart
                         st.subheader("Sentiment Distribution")
-                        dist = sentiment_data.get("Comparative Sentiment Score", {}).get("Sentiment Distribution", {})
+                        comparative = sentiment_data.get("Comparative Sentiment Score", {})
+                        dist = comparative.get("Sentiment Distribution", {})
+                        # Percentages are precomputed when the analysis is written
+                        dist_pct = comparative.get("Sentiment Distribution Pct", {})
 
                         if dist:
                             # Create pie chart
@@ -376,18 +303,11 @@ def main():
                             st.plotly_chart(fig, use_container_width=True)
 
                             # Show counts
-                            total = sum(dist.values())
-                            if total > 0:
-                                pos_pct = dist.get('Positive', 0) / total * 100 if total > 0 else 0
-                                neg_pct = dist.get('Negative', 0) / total * 100 if total > 0 else 0
-                                neu_pct = dist.get('Neutral', 0) / total * 100 if total > 0 else 0
-
-                                col1, col2, col3 = st.columns(3)
-
-                                # col1.metric("Temperature", "70 °F", "1.2 °F")
-                                # col1.metric(st.markdown("Positive"), dist.get('Positive', 0),f"{pos_pct:.1f}%")
-                                # col2.metric("Negative", dist.get('Negative', 0), f"{neg_pct:.1f}%")
-                                # col3.metric("Neutral", dist.get('Neutral', 0), f"{neu_pct:.1f}%")
+                            if dist_pct:
+                                metric_cols = st.columns(3)
+                                for metric_col, label in zip(metric_cols, ("Positive", "Negative", "Neutral")):
+                                    metric_col.metric(label, dist.get(label, 0), f"{dist_pct.get(label, 0):.1f}%",
+                                                      delta_color="off")
 
                 # Tab 2: News Articles
                 with tabs[1]:
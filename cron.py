@@ -1,13 +1,14 @@
-import pandas as pd
+import csv
 import os
-import pickle
-import json
 import asyncio
+import hashlib
 import logging
-from datetime import datetime
+from datetime import date, datetime
+from diskcache import Cache
 from utils.news_scraper import NewsScraper
 from utils.gemini_service import GeminiService
 from utils.text_to_speech import TextToSpeech
+from utils import store
 
 # Configure logging
 logging.basicConfig(
@@ -20,12 +21,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger("cron")
 
+# Scraped articles and analyses are reused for the rest of the day on re-runs
+CACHE_TTL = 86400
+cache = Cache(os.path.join('.cache', 'news'))
+
+# Concurrency limits for each pipeline stage, so a slow stage doesn't hold up the others
+SCRAPE_CONCURRENCY = 8
+GEMINI_CONCURRENCY = 2
+TTS_CONCURRENCY = 4
+
 async def process_company(
     company_name: str, 
     news_scraper: NewsScraper, 
     gemini_service: GeminiService,
     tts_service: TextToSpeech,
     output_dir: str,
+    scrape_sem: asyncio.Semaphore,
+    gemini_sem: asyncio.Semaphore,
+    tts_sem: asyncio.Semaphore,
     num_articles: int = 10,
     days_back: int = 30,
     generate_tts: bool = True
@@ -39,6 +52,9 @@ async def process_company(
         gemini_service: Initialized GeminiService instance
         tts_service: Initialized TextToSpeech instance
         output_dir: Directory to save output files
+        scrape_sem: Semaphore bounding concurrent news scraping
+        gemini_sem: Semaphore bounding concurrent Gemini analyses
+        tts_sem: Semaphore bounding concurrent TTS generation
         num_articles: Number of articles to analyze
         days_back: Number of days back to look for news
         generate_tts: Whether to generate TTS
@@ -47,20 +63,37 @@ async def process_company(
         True if successful, False otherwise
     """
     try:
-        logger.info(f"Processing company: {company_name}")
+        logger.info("Processing company: %s", company_name)
+        slug = store.slugify(company_name)
         
-        # Get news articles
-        articles = news_scraper.get_company_news(
-            company_name=company_name,
-            num_articles=num_articles,
-        )
+        # Get news articles, reusing today's scrape if there is one
+        news_key = ('news', company_name, date.today().isoformat())
+        articles = cache.get(news_key)
+        if articles is None:
+            async with scrape_sem:
+                articles = await news_scraper.get_company_news(
+                    company_name=company_name,
+                    num_articles=num_articles,
+                )
+            if articles:
+                cache.set(news_key, articles, expire=CACHE_TTL)
         
         if not articles:
-            logger.warning(f"No articles found for {company_name}, skipping...")
+            logger.warning("No articles found for %s, skipping...", company_name)
             return False
         
-        # Analyze articles with Gemini
-        analysis_result = gemini_service.analyze_articles(company_name, articles)
+        # Analyze articles with Gemini, reusing the analysis of identical article URLs and content
+        articles_hash = hashlib.sha1()
+        for article in articles:
+            articles_hash.update(f"{article['url']}\0{article['content']}\0".encode('utf-8'))
+        analysis_key = ('analysis', company_name, articles_hash.hexdigest())
+        analysis_result = cache.get(analysis_key)
+        if analysis_result is None:
+            async with gemini_sem:
+                analysis_result = await gemini_service.analyze_articles(company_name, articles)
+            # Only cache analyses where every Gemini call succeeded, so a re-run can retry the rest
+            if gemini_service.is_complete(analysis_result):
+                cache.set(analysis_key, analysis_result, expire=CACHE_TTL)
         
         # Add timestamp
         analysis_result["Timestamp"] = datetime.now().isoformat()
@@ -68,34 +101,29 @@ async def process_company(
         # Generate TTS if requested
         if generate_tts:
             try:
-                analysis_result = await tts_service.process_sentiment_tts(analysis_result,company_name)
-                logger.info(f"Generated TTS for {company_name}")
+                async with tts_sem:
+                    analysis_result = await tts_service.process_sentiment_tts(analysis_result, slug)
+                logger.info("Generated TTS for %s", company_name)
             except Exception as e:
-                logger.error(f"Error generating TTS for {company_name}: {e}")
+                logger.error("Error generating TTS for %s: %s", company_name, e)
                 # Continue with saving the analysis even if TTS fails
         
-        # Save results as pickle
-        output_file = os.path.join(output_dir, f"{company_name.lower().replace(' ', '_')}.pkl")
-        with open(output_file, 'wb') as f:
-            pickle.dump(analysis_result, f)
-        
-        # Save as JSON for easier inspection
-        json_path = os.path.join(output_dir, f"{company_name.lower().replace(' ', '_')}.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(analysis_result, f, ensure_ascii=False, indent=2)
+        # Save results
+        store.save(os.path.join(output_dir, f"{slug}{store.EXTENSION}"), analysis_result)
         
-        logger.info(f"Successfully processed {company_name} and saved results")
+        logger.info("Successfully processed %s and saved results", company_name)
         return True
         
     except Exception as e:
-        logger.error(f"Error processing {company_name}: {e}", exc_info=True)
+        logger.error("Error processing %s: %s", company_name, e, exc_info=True)
         return False
 
 async def main():
     """
     Main cron job function to scrape news and analyze sentiment for all companies
     """
-    logger.info(f"Starting cron job at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    started = datetime.now()
+    logger.info("Starting cron job at %s", started.strftime('%Y-%m-%d %H:%M:%S'))
     
     # Initialize services
     news_scraper = NewsScraper()
@@ -108,38 +136,43 @@ async def main():
     
     # Read company list
     try:
-        companies_df = pd.read_csv(os.path.join('data', 'company_list.csv'))
-        logger.info(f"Found {len(companies_df)} companies in the list")
+        with open(os.path.join('data', 'company_list.csv'), newline='', encoding='utf-8') as f:
+            company_names = [row['name'] for row in csv.DictReader(f)]
+        logger.info("Found %d companies in the list", len(company_names))
     except Exception as e:
-        logger.error(f"Error reading company list: {e}")
+        logger.error("Error reading company list: %s", e)
         return
     
-    # Create a semaphore to limit concurrent processing
-    # This prevents overwhelming the API services
-    semaphore = asyncio.Semaphore(3)  # Process up to 3 companies concurrently
-    
-    async def process_with_semaphore(company_name):
-        async with semaphore:
-            return await process_company(
-                company_name, 
-                news_scraper, 
-                gemini_service,
-                tts_service,
-                output_dir
-            )
+    # Limit each stage separately so companies can overlap stages:
+    # while one waits on Gemini, others can be scraping or generating audio
+    scrape_sem = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+    gemini_sem = asyncio.Semaphore(GEMINI_CONCURRENCY)
+    tts_sem = asyncio.Semaphore(TTS_CONCURRENCY)
     
     # Create tasks for all companies
-    tasks = [process_with_semaphore(row['name']) for _, row in companies_df.iterrows()]
+    tasks = [
+        process_company(
+            company_name, 
+            news_scraper, 
+            gemini_service,
+            tts_service,
+            output_dir,
+            scrape_sem,
+            gemini_sem,
+            tts_sem
+        )
+        for company_name in company_names
+    ]
     
-    # Process all companies concurrently (but limited by the semaphore)
+    # Process all companies concurrently (but limited by the stage semaphores)
     results = await asyncio.gather(*tasks, return_exceptions=True)
     
     # Count successful and failed processes
     success_count = sum(1 for r in results if r is True)
     error_count = sum(1 for r in results if r is False or isinstance(r, Exception))
     
-    logger.info(f"Cron job completed: {success_count} companies processed successfully, {error_count} failed")
-    logger.info(f"Cron job completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info("Cron job completed: %d companies processed successfully, %d failed", success_count, error_count)
+    logger.info("Cron job completed in %s", datetime.now() - started)
 
 if __name__ == "__main__":
     # Run the main function
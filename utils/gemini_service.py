@@ -1,23 +1,247 @@
 import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
+from aiolimiter import AsyncLimiter
+import asyncio
 import os
+import re
 import json
-from typing import List, Dict, Any
+from collections import Counter
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-import time
+from utils.news_scraper import MAX_CONTENT_CHARS
 # Load environment variables
 load_dotenv()
 
+# Outermost JSON object or list in a model response (tolerates code fences and prose)
+_JSON_RE = re.compile(r'(\{.*\}|\[.*\])', re.DOTALL)
+
+
+# Response schema for a single article analysis
+_ARTICLE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'Summary': {'type': 'string'},
+        'Sentiment': {'type': 'string', 'format': 'enum', 'enum': ['Positive', 'Negative', 'Neutral']},
+        'Topics': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['Summary', 'Sentiment', 'Topics']
+}
+
+# Generation settings per prompt type; JSON mode removes the need to hunt for JSON in prose
+_ARTICLE_CONFIG = {
+    'response_mime_type': 'application/json',
+    'response_schema': _ARTICLE_SCHEMA,
+    'temperature': 0.2,
+    'max_output_tokens': 512
+}
+_BATCH_CONFIG = {
+    'response_mime_type': 'application/json',
+    'response_schema': {'type': 'array', 'items': _ARTICLE_SCHEMA},
+    'temperature': 0.2,
+    'max_output_tokens': 4096
+}
+# Topic Overlap has per-article keys, which a fixed schema can't describe
+_COMPARATIVE_CONFIG = {
+    'response_mime_type': 'application/json',
+    'temperature': 0.2,
+    'max_output_tokens': 2048
+}
+_FINAL_SENTIMENT_CONFIG = {
+    'temperature': 0.2,
+    'max_output_tokens': 256
+}
+
+
+# Placeholders returned when a Gemini call fails; results containing them are incomplete
+_ARTICLE_PARSE_ERROR = "Failed to generate summary."
+_ARTICLE_ERROR = "Error analyzing article content."
+_COMPARATIVE_PARSE_ERROR = "Failed to analyze coverage differences."
+_COMPARATIVE_ERROR = "Error generating comparative analysis"
+_FINAL_SENTIMENT_ERROR = "Unable to generate final sentiment analysis"
+
+
+# Prompt for analyzing a batch of articles in one request
+_BATCH_PROMPT = """\
+Analyze the following {count} news articles:
+
+{article_blocks}
+
+For each article, please provide:
+1. A concise summary of the article (2-3 sentences)
+2. The sentiment of the article (Positive, Negative, or Neutral)
+3. A list of main topics covered in the article
+
+Format your response as a JSON list with exactly {count} objects, in the same order as the articles:
+[
+    {{
+        "Summary": "...",
+        "Sentiment": "...",
+        "Topics": ["topic1", "topic2", ...]
+    }},
+    ...
+]
+"""
+
+
+# Prompt for analyzing a single article
+_ARTICLE_PROMPT = """\
+Analyze the following news article:
+
+Title: {title}
+Content: {content}
+
+Please provide:
+1. A concise summary of the article (2-3 sentences)
+2. The sentiment of the article (Positive, Negative, or Neutral)
+3. A list of main topics covered in the article
+
+Format your response as a JSON with the following structure:
+{{
+    "Summary": "...",
+    "Sentiment": "...",
+    "Topics": ["topic1", "topic2", ...]
+}}
+"""
+
+
+# Prompt for the comparative analysis across articles
+_COMPARATIVE_PROMPT = """\
+Analyze the following news articles and provide a comparative analysis:
+
+{summary_block}
+
+Please provide:
+1. Key coverage differences between the articles and their potential impact
+2. Analysis of topic overlap (common topics and unique topics per article)
+
+Format your response as a JSON with the following structure:
+{{
+    "Coverage Differences": [
+        {{
+            "Comparison": "...",
+            "Impact": "..."
+        }},
+        ...
+    ],
+    "Topic Overlap": {{
+        "Common Topics": ["topic1", "topic2", ...],
+        "Unique Topics in Article 1": ["topic1", "topic2", ...],
+        "Unique Topics in Article 2": ["topic1", "topic2", ...],
+        ...
+    }}
+}}
+"""
+
+
+# Prompt for the final sentiment summary
+_FINAL_SENTIMENT_PROMPT = """\
+Based on the following news articles about {company_name}:
+
+{summary_block}
+
+Provide a concise final sentiment analysis in 2-3 sentences. Include:
+1. The overall sentiment toward {company_name} (positive, negative, or mixed)
+2. Key factors driving this sentiment
+3. Brief implications for the company
+
+Respond with only the final sentiment analysis in 2-3 sentences.
+"""
+
+
+def _parse_json(text: str) -> Any:
+    """
+    Extract and decode the JSON payload from a model response
+    
+    Args:
+        text: Raw response text
+        
+    Returns:
+        Decoded JSON value, or None if no valid JSON was found
+    """
+    match = _JSON_RE.search(text)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """
+    Shorten article text for a prompt, cutting at a sentence boundary when possible
+    
+    Args:
+        text: Article text
+        max_chars: Maximum number of characters to keep
+        
+    Returns:
+        Truncated text
+    """
+    if len(text) <= max_chars:
+        return text
+    body = text[:max_chars]
+    cut = body.rfind('. ')
+    # Only cut back to a sentence end if that keeps a useful amount of text
+    return body[:cut + 1] if cut > 200 else body
+
+
+# API key the Gemini SDK was configured with; genai.configure is process-wide
+_configured_api_key: Optional[str] = None
+
+
+def _configure(api_key: str) -> None:
+    """
+    Configure the Gemini SDK once per process
+    
+    Args:
+        api_key: Google API key
+        
+    Raises:
+        ValueError: If the SDK was already configured with a different key
+    """
+    global _configured_api_key
+    if _configured_api_key is None:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+    elif _configured_api_key != api_key:
+        raise ValueError("The Gemini SDK is already configured with a different API key; only one key per process is supported.")
+
+
+@lru_cache(maxsize=None)
+def _get_model(model_name: str) -> genai.GenerativeModel:
+    """
+    Build a model once per process for each model name
+    
+    Args:
+        model_name: Name of the Gemini model
+        
+    Returns:
+        Shared GenerativeModel instance
+    """
+    return genai.GenerativeModel(model_name)
+
+
 class GeminiService:
     """
     Class for interacting with Google's Gemini AI model for text analysis
     """
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, requests_per_minute: int = None, max_prompt_chars: int = None):
         """
         Initialize the Gemini service
         
         Args:
             api_key: Google API key (defaults to environment variable)
+            requests_per_minute: Gemini request quota to stay under
+                (defaults to GEMINI_REQUESTS_PER_MINUTE, or 15)
+            max_prompt_chars: Characters of article content sent per article
+                (defaults to GEMINI_MAX_PROMPT_CHARS, or 1200; capped at the
+                scraper's MAX_CONTENT_CHARS, since articles are never longer)
+                
+        Raises:
+            ValueError: If no API key is available, or a different key was already configured
         """
         # Use provided API key or get from environment variables
         api_key = api_key or os.getenv("GOOGLE_API_KEY")
@@ -25,13 +249,42 @@ class GeminiService:
         if not api_key:
             raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable or pass it to the constructor.")
         
-        # Configure the Gemini API
-        genai.configure(api_key=api_key)
+        # Configure the SDK once and get the shared model
+        _configure(api_key)
+        self.model = _get_model('gemini-1.5-flash')
+        
+        # Pace requests to the quota instead of sleeping between calls
+        requests_per_minute = requests_per_minute or int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 15))
+        self._limiter = AsyncLimiter(requests_per_minute, 60)
         
-        # Get the model
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+        # The headline and lede are usually enough to judge sentiment
+        max_prompt_chars = max_prompt_chars or int(os.getenv("GEMINI_MAX_PROMPT_CHARS", 1200))
+        if max_prompt_chars > MAX_CONTENT_CHARS:
+            print(f"max_prompt_chars={max_prompt_chars} exceeds the scraped article length; using {MAX_CONTENT_CHARS}")
+        self.max_prompt_chars = min(max_prompt_chars, MAX_CONTENT_CHARS)
     
-    def analyze_articles(self, company_name: str, articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def _generate(self, prompt: str, generation_config: Dict[str, Any] = None, retries: int = 3):
+        """
+        Send a prompt to Gemini, respecting the rate limit and backing off on quota errors
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation settings for this request
+            retries: Number of retries after a quota error
+            
+        Returns:
+            Gemini response
+        """
+        for attempt in range(retries + 1):
+            try:
+                async with self._limiter:
+                    return await self.model.generate_content_async(prompt, generation_config=generation_config)
+            except ResourceExhausted:
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(2 ** attempt * 10)
+    
+    async def analyze_articles(self, company_name: str, articles: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Analyze news articles using Gemini AI
         
@@ -50,28 +303,35 @@ class GeminiService:
                 "Final Sentiment Analysis": "No articles available for analysis."
             }
         
-        # Process each article individually
-        processed_articles = []
+        # Analyze all articles in a single request
+        processed_articles = await self._analyze_articles_batch(articles)
         
-        for article in articles:
-            article_analysis = self._analyze_single_article(article)
-            processed_articles.append(article_analysis)
-            time.sleep(20)
-
-
+        if processed_articles is None:
+            # Fall back to one request per article, run concurrently under the rate limiter
+            processed_articles = list(await asyncio.gather(
+                *[self._analyze_single_article(article) for article in articles]
+            ))
         
-        # Generate comparative analysis
+        # Format the article summaries once; both follow-up prompts embed them
+        summary_block = "\n\n".join(
+            f"Article {i+1}: {a['Title']}\nSummary: {a['Summary']}\nSentiment: {a['Sentiment']}\nTopics: {', '.join(a['Topics'])}"
+            for i, a in enumerate(processed_articles)
+        )
+        
+        # Generate comparative analysis and final sentiment analysis concurrently
         if len(processed_articles) > 1:
-            comparative_analysis = self._generate_comparative_analysis(processed_articles)
+            comparative_analysis, final_sentiment = await asyncio.gather(
+                self._generate_comparative_analysis(processed_articles, summary_block),
+                self._generate_final_sentiment(company_name, summary_block)
+            )
         else:
             comparative_analysis = {
                 "Sentiment Distribution": {},
+                "Sentiment Distribution Pct": {},
                 "Coverage Differences": [],
                 "Topic Overlap": {}
             }
-        
-        # Generate final sentiment analysis
-        final_sentiment = self._generate_final_sentiment(company_name, processed_articles)
+            final_sentiment = await self._generate_final_sentiment(company_name, summary_block)
         
         # Compile the complete analysis
         result = {
@@ -83,148 +343,163 @@ class GeminiService:
         
         return result
     
-    def _analyze_single_article(self, article: Dict[str, str]) -> Dict[str, Any]:
+    def is_complete(self, result: Dict[str, Any]) -> bool:
         """
-        Analyze a single article using Gemini AI
+        Check whether an analyze_articles result came back without any failed Gemini calls
+        
+        Args:
+            result: Dictionary returned by analyze_articles
+            
+        Returns:
+            False if any article, the comparative analysis or the final sentiment
+            fell back to an error placeholder, True otherwise
+        """
+        if any(article.get("Summary") in (_ARTICLE_PARSE_ERROR, _ARTICLE_ERROR) for article in result.get("Articles", [])):
+            return False
+        
+        for difference in result.get("Comparative Sentiment Score", {}).get("Coverage Differences", []):
+            comparison = difference.get("Comparison", "") if isinstance(difference, dict) else ""
+            if comparison == _COMPARATIVE_PARSE_ERROR or comparison.startswith(_COMPARATIVE_ERROR):
+                return False
+        
+        return not result.get("Final Sentiment Analysis", "").startswith(_FINAL_SENTIMENT_ERROR)
+    
+    def _article_result(self, article: Dict[str, str], analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Combine Gemini's analysis of an article with the original article info
         
         Args:
             article: Dictionary containing article title and content
+            analysis: Parsed analysis with Summary, Sentiment and Topics
             
         Returns:
             Dictionary with analysis results for the article
         """
+        # Models sometimes return null or a bare string for Topics; the summary block joins them
+        topics = analysis.get("Topics") or ["Unknown"]
+        if isinstance(topics, str):
+            topics = [topics]
+        
+        return {
+            "Title": article['title'],
+            "URL": article.get('url', ''),
+            "Summary": analysis.get("Summary") or "No summary available",
+            "Sentiment": analysis.get("Sentiment") or "Neutral",
+            "Topics": [str(topic) for topic in topics]
+        }
+    
+    async def _analyze_articles_batch(self, articles: List[Dict[str, str]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Analyze all articles with a single Gemini request
+        
+        Args:
+            articles: List of dictionaries containing article title and content
+            
+        Returns:
+            List of analysis results in article order, or None if the response
+            could not be matched back to the articles
+        """
         try:
-            prompt = f"""
-            Analyze the following news article:
+            article_blocks = "\n\n".join(
+                f"Article {i+1}:\nTitle: {article['title']}\nContent: {_truncate(article['content'], self.max_prompt_chars)}"
+                for i, article in enumerate(articles)
+            )
+            
+            prompt = _BATCH_PROMPT.format(count=len(articles), article_blocks=article_blocks)
+            
+            response = await self._generate(prompt, _BATCH_CONFIG)
             
-            Title: {article['title']}
-            Content: {article['content']}
+            # Parse the JSON list
+            analyses = _parse_json(response.text)
+            if not isinstance(analyses, list) or len(analyses) != len(articles):
+                print(f"Batch analysis returned {len(analyses) if isinstance(analyses, list) else 'no'} results for {len(articles)} articles")
+                return None
             
-            Please provide:
-            1. A concise summary of the article (2-3 sentences)
-            2. The sentiment of the article (Positive, Negative, or Neutral)
-            3. A list of main topics covered in the article
+            return [self._article_result(article, analysis) for article, analysis in zip(articles, analyses)]
+            
+        except Exception as e:
+            print(f"Error analyzing article batch: {e}")
+            return None
+    
+    async def _analyze_single_article(self, article: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Analyze a single article using Gemini AI
+        
+        Args:
+            article: Dictionary containing article title and content
             
-            Format your response as a JSON with the following structure:
-            {{
-                "Summary": "...",
-                "Sentiment": "...",
-                "Topics": ["topic1", "topic2", ...]
-            }}
-            """
+        Returns:
+            Dictionary with analysis results for the article
+        """
+        try:
+            prompt = _ARTICLE_PROMPT.format(
+                title=article['title'],
+                content=_truncate(article['content'], self.max_prompt_chars)
+            )
             
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt, _ARTICLE_CONFIG)
             
             # Parse the JSON response
-            response_text = response.text
-            # Extract the JSON part
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
+            analysis = _parse_json(response.text)
             
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                analysis = json.loads(json_str)
-            else:
+            if not isinstance(analysis, dict):
                 # If JSON parsing fails, create a basic structure
                 analysis = {
-                    "Summary": "Failed to generate summary.",
+                    "Summary": _ARTICLE_PARSE_ERROR,
                     "Sentiment": "Neutral",
                     "Topics": ["Unknown"]
                 }
             
             # Combine with original article info
-            result = {
-                "Title": article['title'],
-                "URL": article.get('url', ''),
-                "Summary": analysis.get("Summary", "No summary available"),
-                "Sentiment": analysis.get("Sentiment", "Neutral"),
-                "Topics": analysis.get("Topics", ["Unknown"])
-            }
-            
-            return result
+            return self._article_result(article, analysis)
             
         except Exception as e:
             print(f"Error analyzing article: {e}")
             return {
                 "Title": article['title'],
                 "URL": article.get('url', ''),
-                "Summary": "Error analyzing article content.",
+                "Summary": _ARTICLE_ERROR,
                 "Sentiment": "Neutral",
                 "Topics": ["Error"]
             }
     
-    def _generate_comparative_analysis(self, articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def _generate_comparative_analysis(self, articles: List[Dict[str, Any]], summary_block: str) -> Dict[str, Any]:
         """
         Generate comparative analysis across multiple articles
         
         Args:
             articles: List of processed article dictionaries
+            summary_block: Formatted summaries of the processed articles
             
         Returns:
             Dictionary with comparative analysis
         """
         try:
-            # Count sentiments
-            sentiments = [article["Sentiment"] for article in articles]
+            # Count sentiments in a single pass over the articles
+            counts = Counter(article["Sentiment"] for article in articles)
             sentiment_distribution = {
-                "Positive": sentiments.count("Positive"),
-                "Negative": sentiments.count("Negative"),
-                "Neutral": sentiments.count("Neutral")
+                sentiment: counts[sentiment] for sentiment in ("Positive", "Negative", "Neutral")
+            }
+            total = sum(sentiment_distribution.values())
+            sentiment_distribution_pct = {
+                sentiment: (count / total * 100 if total else 0.0)
+                for sentiment, count in sentiment_distribution.items()
             }
-            
-            # Prepare article summaries for Gemini
-            article_summaries = []
-            for i, article in enumerate(articles):
-                article_summaries.append(f"Article {i+1}: {article['Title']}\nSummary: {article['Summary']}\nSentiment: {article['Sentiment']}\nTopics: {', '.join(article['Topics'])}")
-            
-            all_summaries = "\n\n".join(article_summaries)
             
             # Generate comparative analysis with Gemini
-            prompt = f"""
-            Analyze the following news articles and provide a comparative analysis:
-            
-            {all_summaries}
-            
-            Please provide:
-            1. Key coverage differences between the articles and their potential impact
-            2. Analysis of topic overlap (common topics and unique topics per article)
-            
-            Format your response as a JSON with the following structure:
-            {{
-                "Coverage Differences": [
-                    {{
-                        "Comparison": "...",
-                        "Impact": "..."
-                    }},
-                    ...
-                ],
-                "Topic Overlap": {{
-                    "Common Topics": ["topic1", "topic2", ...],
-                    "Unique Topics in Article 1": ["topic1", "topic2", ...],
-                    "Unique Topics in Article 2": ["topic1", "topic2", ...],
-                    ...
-                }}
-            }}
-            """
+            prompt = _COMPARATIVE_PROMPT.format(summary_block=summary_block)
             
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt, _COMPARATIVE_CONFIG)
             
             # Parse the JSON response
-            response_text = response.text
+            comparative = _parse_json(response.text)
             
-            # Extract the JSON part
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                comparative = json.loads(json_str)
-            else:
+            if not isinstance(comparative, dict):
                 # If JSON parsing fails, create a basic structure
                 comparative = {
                     "Coverage Differences": [
                         {
-                            "Comparison": "Failed to analyze coverage differences.",
+                            "Comparison": _COMPARATIVE_PARSE_ERROR,
                             "Impact": "Unknown"
                         }
                     ],
@@ -237,6 +512,7 @@ class GeminiService:
             # Add sentiment distribution to the result
             result = {
                 "Sentiment Distribution": sentiment_distribution,
+                "Sentiment Distribution Pct": sentiment_distribution_pct,
                 "Coverage Differences": comparative.get("Coverage Differences", []),
                 "Topic Overlap": comparative.get("Topic Overlap", {})
             }
@@ -247,52 +523,35 @@ class GeminiService:
             print(f"Error generating comparative analysis: {e}")
             return {
                 "Sentiment Distribution": {},
+                "Sentiment Distribution Pct": {},
                 "Coverage Differences": [
                     {
-                        "Comparison": f"Error generating comparative analysis: {str(e)}",
+                        "Comparison": f"{_COMPARATIVE_ERROR}: {str(e)}",
                         "Impact": "Unknown"
                     }
                 ],
                 "Topic Overlap": {}
             }
     
-    def _generate_final_sentiment(self, company_name: str, articles: List[Dict[str, Any]]) -> str:
+    async def _generate_final_sentiment(self, company_name: str, summary_block: str) -> str:
         """
         Generate final sentiment analysis summary
         
         Args:
             company_name: Name of the company
-            articles: List of processed article dictionaries
+            summary_block: Formatted summaries of the processed articles
             
         Returns:
             String with final sentiment analysis
         """
         try:
-            # Prepare article summaries for Gemini
-            article_summaries = []
-            for i, article in enumerate(articles):
-                article_summaries.append(f"Article {i+1}: {article['Title']}\nSummary: {article['Summary']}\nSentiment: {article['Sentiment']}")
-            
-            all_summaries = "\n\n".join(article_summaries)
-            
-            prompt = f"""
-            Based on the following news articles about {company_name}:
-            
-            {all_summaries}
-            
-            Provide a concise final sentiment analysis in 2-3 sentences. Include:
-            1. The overall sentiment toward {company_name} (positive, negative, or mixed)
-            2. Key factors driving this sentiment
-            3. Brief implications for the company
-            
-            Respond with only the final sentiment analysis in 2-3 sentences.
-            """
+            prompt = _FINAL_SENTIMENT_PROMPT.format(company_name=company_name, summary_block=summary_block)
             
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt, _FINAL_SENTIMENT_CONFIG)
             final_sentiment = response.text.strip()
             
             return final_sentiment
             
         except Exception as e:
             print(f"Error generating final sentiment: {e}")
-            return f"Unable to generate final sentiment analysis for {company_name} due to an error." 
\ No newline at end of file
+            return f"{_FINAL_SENTIMENT_ERROR} for {company_name} due to an error." 
\ No newline at end of file
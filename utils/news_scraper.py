@@ -1,142 +1,226 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import httpx
+from aiolimiter import AsyncLimiter
+from collections import defaultdict
+from selectolax.lexbor import LexborHTMLParser
+import trafilatura
+import json
 import re
-from typing import List, Dict, Any
-import time
-import random
+from typing import List, Dict, Any, Optional
+from urllib.parse import urlparse
+
+# Target URL inside a Google "/url?..." redirect link
+_REDIRECT_RE = re.compile(r'url=([^&]+)')
+
+# JavaScript-heavy sites and other unwanted domains
+_BLOCKED_DOMAINS = frozenset({'youtube.com', 'facebook.com', 'twitter.com', 'instagram.com'})
+
+# Characters of article text kept after scraping; this is also the ceiling for
+# how much of an article GeminiService can put in a prompt
+MAX_CONTENT_CHARS = 1500
+
+# Title of the placeholder article returned when a page can't be fetched
+_SCRAPE_ERROR_TITLE = "Error scraping article"
+
+
+def _is_blocked(link: str) -> bool:
+    """Check whether a link points at a blocked domain or one of its subdomains"""
+    host = urlparse(link).netloc.lower()
+    return any(host == domain or host.endswith('.' + domain) for domain in _BLOCKED_DOMAINS)
+
 
 class NewsScraper:
     """
     Class for scraping news articles about companies from Google News
     """
-    
+
     def __init__(self):
         """Initialize the scraper with headers to mimic a browser"""
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
+            # Brotli is left out since decoding it needs an optional extra package
+            'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         }
-    
-    def get_news_links(self, company_name: str, num_articles: int = 20) -> List[str]:
+
+        # Shared async client for concurrent, keep-alive fetching, created on first use
+        self._client: Optional[httpx.AsyncClient] = None
+        # Bound the number of article pages fetched at once
+        self._fetch_semaphore = asyncio.Semaphore(8)
+        # Per-host pacing: at most 2 requests per second to any one site
+        self._host_limiters = defaultdict(lambda: AsyncLimiter(2, 1))
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the shared HTTP client, creating it if needed"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=10,
+                follow_redirects=True,
+                # Retry failed connection attempts; the transport also owns the pool limits
+                transport=httpx.AsyncHTTPTransport(
+                    retries=2,
+                    limits=httpx.Limits(max_connections=20),
+                ),
+            )
+        return self._client
+
+    def _search_url(self, company_name: str) -> str:
+        """Build the Google News search URL for a company"""
+        # Format company name for URL
+        query = company_name.replace(' ', '+')
+        return f"https://www.google.com/search?q={query}+news&tbm=nws&num=100"
+
+    def _parse_news_links(self, html: str, num_articles: int) -> List[str]:
+        """
+        Extract article links from a Google News results page
+
+        Args:
+            html: HTML of the search results page
+            num_articles: Maximum number of links to return
+
+        Returns:
+            List of URLs to news articles
+        """
+        tree = LexborHTMLParser(html)
+
+        # Extract all news article links
+        links = []
+        for g in tree.css('div.SoaBEf'):
+            # Find the anchor tag with the link
+            a_tag = g.css_first('a')
+            link = a_tag.attributes.get('href') if a_tag else None
+            if link:
+                # Check if it's a Google redirect URL
+                if link.startswith('/url?'):
+                    # Extract the actual URL
+                    match = _REDIRECT_RE.search(link)
+                    link = match.group(1) if match else None
+                if link:
+                    # Filter out JavaScript-heavy sites and other unwanted domains
+                    if not _is_blocked(link):
+                        links.append(link)
+                        if len(links) >= num_articles:
+                            break
+        return links
+
+    def _parse_article(self, url: str, html: str) -> Dict[str, Any]:
+        """
+        Extract the title and content from an article page
+
+        Args:
+            url: URL the page was fetched from
+            html: HTML of the article page
+
+        Returns:
+            Dictionary containing the title and content of the article
+        """
+        # Extract the title and main article text in one trafilatura pass,
+        # dropping navigation, comments and other boilerplate
+        extracted = trafilatura.extract(
+            html,
+            url=url,
+            output_format='json',
+            with_metadata=True,
+            include_comments=False,
+            include_tables=False,
+            favor_precision=True,
+            fast=True
+        )
+        result = json.loads(extracted) if extracted else {}
+        title = result.get('title') or "No title found"
+        content = result.get('text') or ''
+
+        # Clean the content
+        content = re.sub(r'\s+', ' ', content).strip()
+
+        # If content is too short, it might not be the actual article
+        if len(content) < 100:
+            content = "Unable to extract meaningful content from this webpage."
+
+        return {
+            "url": url,
+            "title": title,
+            "content": content[:MAX_CONTENT_CHARS]  # Only the opening of the article is sent to Gemini
+        }
+
+    def _scrape_error(self, url: str, error: Exception) -> Dict[str, Any]:
+        """Build the placeholder article returned when scraping fails"""
+        print(f"Error scraping article at {url}: {error}")
+        return {
+            "url": url,
+            "title": _SCRAPE_ERROR_TITLE,
+            "content": f"Failed to extract content: {str(error)}"
+        }
+
+    def _select_articles(self, company_name: str, scraped: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep at most 10 articles with meaningful content, dropping pages that failed to scrape"""
+        articles = []
+
+        for article in scraped:
+            if article["title"] == _SCRAPE_ERROR_TITLE:
+                continue
+            if article["content"] != "Unable to extract meaningful content from this webpage.":
+                if len(articles)<10:
+                    articles.append(article)
+
+        print(f"Scraped {len(articles)} articles for {company_name}")
+        return articles
+
+    async def get_news_links(self, company_name: str, num_articles: int = 20) -> List[str]:
         """
-        Get links to news articles about a company from Google News
-        
+        Get links to news articles about a company from Google News without blocking the event loop
+
         Args:
             company_name: The name of the company
             num_articles: Maximum number of articles to fetch
-            
+
         Returns:
             List of URLs to news articles
         """
-        # Format company name for URL
-        query = company_name.replace(' ', '+')
-        url = f"https://www.google.com/search?q={query}+news&tbm=nws&num=100"
-        
         try:
-            response = requests.get(url, headers=self.headers)
+            response = await self._get_client().get(self._search_url(company_name))
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract all news article links
-            links = []
-            i=1
-            for g in soup.find_all('div', class_='SoaBEf'):
-                # Find the anchor tag with the link
-                a_tag = g.find('a')
-                if a_tag and 'href' in a_tag.attrs:
-                    link = a_tag['href']
-                    # Check if it's a Google redirect URL
-                    if link.startswith('/url?'):
-                        # Extract the actual URL
-                        link = re.search(r'url=([^&]+)', link).group(1)
-                    if link:
-                        # Filter out JavaScript-heavy sites and other unwanted domains
-                        if not any(domain in link for domain in ['youtube.com', 'facebook.com', 'twitter.com', 'instagram.com']):
-                            links.append(link)
-                            if len(links) >= num_articles:
-                                break
-            return links
-        
+            return self._parse_news_links(response.text, num_articles)
+
         except Exception as e:
             print(f"Error fetching news links for {company_name}: {e}")
             return []
-    
-    def scrape_article(self, url: str) -> Dict[str, Any]:
+
+    async def scrape_article(self, url: str) -> Dict[str, Any]:
         """
-        Scrape the content of a news article
-        
+        Scrape the content of a news article without blocking the event loop
+
         Args:
             url: URL of the article to scrape
-            
+
         Returns:
             Dictionary containing the title and content of the article
         """
         try:
-            # Add a random delay to avoid being blocked
-            time.sleep(random.uniform(1, 3))
-            
-            response = requests.get(url, headers=self.headers, timeout=10)
+            # Pace requests per host to avoid being blocked; different hosts aren't delayed
+            async with self._host_limiters[urlparse(url).netloc], self._fetch_semaphore:
+                response = await self._get_client().get(url)
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract title
-            title = soup.title.text if soup.title else "No title found"
-            
-            # Extract article content
-            # First try to find article tags
-            article_tag = soup.find('article')
-            
-            if article_tag:
-                content = ' '.join([p.text for p in article_tag.find_all(['p', 'h1', 'h2', 'h3'])])
-            else:
-                # If no article tag, try to find content in p tags
-                content = ' '.join([p.text for p in soup.find_all('p')])
-            
-            # Clean the content
-            content = re.sub(r'\s+', ' ', content).strip()
-            
-            # If content is too short, it might not be the actual article
-            if len(content) < 100:
-                content = "Unable to extract meaningful content from this webpage."
-            
-            return {
-                "url": url,
-                "title": title,
-                "content": content[:5000]  # Limit content length
-            }
-            
+            return self._parse_article(url, response.text)
+
         except Exception as e:
-            print(f"Error scraping article at {url}: {e}")
-            return {
-                "url": url,
-                "title": "Error scraping article",
-                "content": f"Failed to extract content: {str(e)}"
-            }
-    
-    def get_company_news(self, company_name: str, num_articles: int = 20) -> List[Dict[str, Any]]:
+            return self._scrape_error(url, e)
+
+    async def get_company_news(self, company_name: str, num_articles: int = 20) -> List[Dict[str, Any]]:
         """
-        Get news articles about a company
-        
+        Get news articles about a company, fetching all articles concurrently
+
         Args:
             company_name: The name of the company
             num_articles: Maximum number of articles to fetch
-            
+
         Returns:
             List of dictionaries containing article information
         """
-        links = self.get_news_links(company_name, num_articles)
-        articles = []
-        
-        for link in links:
-            article = self.scrape_article(link)
-            if article["content"] != "Unable to extract meaningful content from this webpage.":
-                if len(articles)<10:
-                    articles.append(article)
-        
-        print(f"Scraped {len(articles)} articles for {company_name}")
-        return articles 
\ No newline at end of file
+        links = await self.get_news_links(company_name, num_articles)
+        scraped = await asyncio.gather(*[self.scrape_article(link) for link in links])
+        return self._select_articles(company_name, scraped)
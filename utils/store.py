@@ -0,0 +1,55 @@
+import os
+import re
+import msgpack
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+# File extension used for persisted analysis results
+EXTENSION = ".mpk"
+
+# Runs of characters that are not safe in a file name
+_UNSAFE_RE = re.compile(r'\W+')
+
+
+@lru_cache(maxsize=1024)
+def slugify(company_name: str) -> str:
+    """
+    Get the file name stem used for a company's output files
+
+    Args:
+        company_name: Name of the company
+
+    Returns:
+        Lowercase name with runs of non-word characters replaced by underscores
+    """
+    return _UNSAFE_RE.sub('_', company_name.lower()).strip('_')
+
+
+def save(path: str, obj: Any) -> None:
+    """
+    Serialize an object to disk with msgpack
+
+    The data is written to a temporary file and moved into place with
+    os.replace, so readers never see a partially written file.
+
+    Args:
+        path: Destination file path
+        obj: Object made of dicts, lists, strings and numbers
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    Path(tmp_path).write_bytes(msgpack.packb(obj, use_bin_type=True))
+    os.replace(tmp_path, path)
+
+
+def load(path: str) -> Any:
+    """
+    Load an object previously written with save()
+
+    Args:
+        path: File path to read
+
+    Returns:
+        The deserialized object
+    """
+    return msgpack.unpackb(Path(path).read_bytes(), raw=False)
@@ -1,7 +1,17 @@
 from gtts import gTTS
 from googletrans import Translator
+import asyncio
 import os
+from functools import lru_cache
 from typing import Dict, Any
+from utils import store
+
+
+@lru_cache(maxsize=1)
+def _get_translator() -> Translator:
+    """Get the process-wide Translator instance"""
+    return Translator()
+
 
 class TextToSpeech:
     """
@@ -9,8 +19,8 @@ class TextToSpeech:
     """
     
     def __init__(self):
-        """Initialize the translator"""
-        self.translator = Translator()
+        """Initialize with the shared translator"""
+        self.translator = _get_translator()
     
     async def translate_to_hindi(self, text: str) -> str:
         """
@@ -30,6 +40,18 @@ class TextToSpeech:
             print(f"Translation error: {e}")
             return text  # Return original text if translation fails
     
+    def get_audio_path(self, company_name: str) -> str:
+        """
+        Get the path the audio file for a company is saved to
+
+        Args:
+            company_name: Name of the company (or its slug)
+
+        Returns:
+            Path to the company's audio file
+        """
+        return os.path.join('data', 'audio', f"{store.slugify(company_name)}_hindi.mp3")
+
     def generate_audio(self, hindi_text: str, company_name:str,lang: str = 'hi',) -> str:
         """
         Generate audio file from text
@@ -44,11 +66,8 @@ class TextToSpeech:
         """
         try:
 
-            audio_dir = os.path.join('data', 'audio')
-            os.makedirs(audio_dir, exist_ok=True)
-
-            audio_filename = f"{company_name}_hindi.mp3"
-            audio_path = os.path.join(audio_dir, audio_filename)
+            audio_path = self.get_audio_path(company_name)
+            os.makedirs(os.path.dirname(audio_path), exist_ok=True)
             print(audio_path)
 
             if hindi_text and hindi_text.strip():
@@ -78,8 +97,9 @@ class TextToSpeech:
         # Translate to Hindi
         hindi_text = await self.translate_to_hindi(final_sentiment)
         
-        # Generate audio
-        audio_path = self.generate_audio(hindi_text,company_name,"hi")
+        # Generate audio in a worker thread; gTTS.save blocks on an HTTP request
+        loop = asyncio.get_running_loop()
+        audio_path = await loop.run_in_executor(None, self.generate_audio, hindi_text, company_name, "hi")
         
         # Add to the sentiment data
         result = sentiment_data.copy()